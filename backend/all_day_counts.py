@@ -0,0 +1,167 @@
+import os
+import time
+import boto3
+from collections import defaultdict
+
+# Initialize AWS clients
+dynamodb = boto3.resource('dynamodb')
+
+# Get environment variables set by Terraform
+ORDERS_TABLE_NAME = os.environ.get('ORDERS_TABLE')
+ALL_DAY_COUNTS_TABLE_NAME = os.environ.get('ALL_DAY_COUNTS_TABLE')
+
+# Initialize DynamoDB Table resources
+orders_table = dynamodb.Table(ORDERS_TABLE_NAME)
+all_day_counts_table = dynamodb.Table(ALL_DAY_COUNTS_TABLE_NAME)
+
+# Uber order states after which a ticket no longer counts towards the all-day totals.
+CLOSED_ORDER_STATES = {'DENIED', 'FINISHED', 'CANCELED', 'CANCELLED'}
+
+# DynamoDB caps a transaction at 100 actions; one is reserved for the order itself.
+MAX_COUNTERS_PER_TRANSACTION = 99
+
+
+def is_open_order(order):
+    """Returns True if the order exists and is still on the kitchen's plate."""
+    return bool(order) and str(order.get('State') or '').upper() not in CLOSED_ORDER_STATES
+
+
+def ticket_sku_counts(order):
+    """
+    Sums the quantities of every item and modifier on a ticket by InternalSKU.
+    Modifier quantities are per item, so they are multiplied by the item quantity.
+    Returns {InternalSKU: (Title, Count)}.
+    """
+    counts = defaultdict(int)
+    titles = {}
+    for item in order.get('Items', []):
+        item_quantity = int(item.get('Quantity', 1))
+        sku = item.get('InternalSKU')
+        if sku:
+            counts[sku] += item_quantity
+            titles[sku] = item.get('Title')
+        for modifier in item.get('Modifiers', []):
+            modifier_sku = modifier.get('InternalSKU')
+            if modifier_sku:
+                counts[modifier_sku] += int(modifier.get('Quantity', 1)) * item_quantity
+                titles[modifier_sku] = modifier.get('Title')
+    return {sku: (titles[sku], count) for sku, count in counts.items()}
+
+
+def count_deltas(previous_order, order):
+    """
+    Works out how the all-day totals change when previous_order (None for a new
+    order) is replaced by order. Only SKUs whose count changes are returned.
+    """
+    old_counts = ticket_sku_counts(previous_order) if is_open_order(previous_order) else {}
+    new_counts = ticket_sku_counts(order) if is_open_order(order) else {}
+
+    deltas = {}
+    for sku in old_counts.keys() | new_counts.keys():
+        title, new_count = new_counts.get(sku, (None, 0))
+        old_title, old_count = old_counts.get(sku, (None, 0))
+        if new_count != old_count:
+            deltas[sku] = (title or old_title, new_count - old_count)
+    return deltas
+
+
+def _counter_update(store_id, sku, title, delta, now):
+    return {
+        'Update': {
+            'TableName': ALL_DAY_COUNTS_TABLE_NAME,
+            'Key': {'StoreID': store_id, 'InternalSKU': sku},
+            'UpdateExpression': 'ADD #count :delta SET Title = :title, UpdatedAt = :now',
+            'ExpressionAttributeNames': {'#count': 'Count'},
+            'ExpressionAttributeValues': {':delta': delta, ':title': title or sku, ':now': now}
+        }
+    }
+
+
+def save_order_with_counts(order, save_if_new=True):
+    """
+    Saves the filtered order to the Orders table and applies the change in its
+    item counts to the all-day aggregate in the same DynamoDB transaction.
+
+    The order carries a Version number and the write is conditioned on the
+    version that was read, so a concurrent or retried save fails and is retried
+    by SQS rather than applying the same delta twice. An order that was saved
+    as closed keeps its closed State. With save_if_new=False an order that was
+    never saved is left unsaved and None is returned.
+    Returns the new totals for every SKU that changed.
+    """
+    order_id = order['OrderID']
+
+    previous_order = orders_table.get_item(Key={'OrderID': order_id}, ConsistentRead=True).get('Item')
+    if previous_order is None and not save_if_new:
+        return None
+    # A payload without a store keeps the store the order was saved under
+    if not order.get('StoreID') and previous_order:
+        order['StoreID'] = previous_order.get('StoreID')
+    store_id = order.get('StoreID')
+    previous_version = previous_order.get('Version') if previous_order else None
+    order['Version'] = int(previous_version or 0) + 1
+    # Closed states are final. A late or replayed event can carry an older,
+    # open state, which must not reopen the ticket or re-add its counts.
+    if previous_order and not is_open_order(previous_order) and is_open_order(order):
+        print(f"Order {order_id} is already {previous_order.get('State')}. Keeping that state.")
+        order['State'] = previous_order.get('State')
+    # The Put replaces the row, so the marker of the last pushed version is carried over
+    if previous_order and previous_order.get('PushedVersion') is not None:
+        order['PushedVersion'] = previous_order['PushedVersion']
+    # An order keeps the history slot it was first saved under
+    if previous_order and previous_order.get('CreatedAt'):
+        order['StoreDay'] = previous_order['StoreDay']
+        order['CreatedAt'] = previous_order['CreatedAt']
+
+    if previous_order is None:
+        condition = {'ConditionExpression': 'attribute_not_exists(OrderID)'}
+    elif previous_version is None:
+        condition = {'ConditionExpression': 'attribute_not_exists(Version)'}
+    else:
+        condition = {
+            'ConditionExpression': 'Version = :version',
+            'ExpressionAttributeValues': {':version': previous_version}
+        }
+
+    # Rows saved before the all-day counts existed have no Version and were
+    # never counted, so there is nothing of theirs to take back out.
+    counted_order = previous_order if previous_version is not None else None
+    deltas = count_deltas(counted_order, order) if store_id else {}
+    now = int(time.time())
+    counter_updates = [_counter_update(store_id, sku, title, delta, now) for sku, (title, delta) in deltas.items()]
+
+    # The resource's client accepts plain Python values, same as Table.put_item.
+    dynamodb.meta.client.transact_write_items(
+        TransactItems=[
+            {'Put': {'TableName': ORDERS_TABLE_NAME, 'Item': order, **condition}},
+            *counter_updates[:MAX_COUNTERS_PER_TRANSACTION]
+        ]
+    )
+
+    # Carts with more distinct SKUs than fit in one transaction are rare; the
+    # remainder is applied right after the order is committed.
+    for update in counter_updates[MAX_COUNTERS_PER_TRANSACTION:]:
+        params = update['Update']
+        all_day_counts_table.update_item(**{k: v for k, v in params.items() if k != 'TableName'})
+
+    if deltas:
+        print(f"Updated all-day counts for {len(deltas)} SKUs in store {store_id}.")
+    return get_counts(store_id, list(deltas.keys())) if deltas else []
+
+
+def get_counts(store_id, skus):
+    """Reads the current all-day totals for the given SKUs of a store."""
+    counts = []
+    for start in range(0, len(skus), 100):
+        keys = [{'StoreID': store_id, 'InternalSKU': sku} for sku in skus[start:start + 100]]
+        request = {ALL_DAY_COUNTS_TABLE_NAME: {'Keys': keys}}
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for row in response['Responses'].get(ALL_DAY_COUNTS_TABLE_NAME, []):
+                counts.append({
+                    'InternalSKU': row['InternalSKU'],
+                    'Title': row.get('Title'),
+                    'Count': int(row.get('Count', 0))
+                })
+            request = response.get('UnprocessedKeys')
+    return counts
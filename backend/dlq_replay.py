@@ -0,0 +1,289 @@
+"""
+Drains the order processing dead letter queue and replays what is still worth
+replaying, at a controlled concurrency and rate.
+
+Every message is classified as one of:
+  processed  - a new-order notification for an order whose ticket was pushed
+               to AppSync at some point (PushedVersion set on the Orders row);
+               later events such as cancels are never dropped on that basis
+  duplicate  - the same event for the same order appears earlier in the same
+               received batch; messages already replayed are never compared
+  stale      - older than --max-age-hours; the kitchen no longer needs it
+  invalid    - not a webhook payload with a resource_href; left in the DLQ
+  retryable  - replayed through order_processor.handler or the main queue
+
+Processed, duplicate and stale messages are deleted; retryable ones are deleted
+once their replay succeeds. Nothing is deleted or replayed with --dry-run.
+
+Usage (handler mode needs the OrderProcessor's environment variables):
+    python dlq_replay.py --target queue --concurrency 4 --rate 2 --dry-run
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import boto3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# Initialize AWS clients
+sqs = boto3.client('sqs')
+dynamodb = boto3.resource('dynamodb')
+
+# Defaults match the names in terraform/lambda.tf and terraform/dynamodb_tables.tf
+DLQ_NAME = "OrderProcessingDeadletterQueue"
+MAIN_QUEUE_NAME = "OrderProcessingQueue"
+ORDERS_TABLE_NAME = os.environ.get('ORDERS_TABLE', "Momotaro-Dashboard-Orders")
+
+# Events that only announce an order; safe to drop once the order is pushed
+NEW_ORDER_EVENT_TYPES = {'orders.notification', None}
+
+# Long enough that a message is not redelivered while this run is still replaying it
+RECEIVE_VISIBILITY_TIMEOUT = 900
+
+
+class RateLimiter:
+    """
+    Spaces calls at least 1/rate seconds apart across all worker threads.
+    """
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        time.sleep(max(0, slot - now))
+
+
+def receive_batches(queue_url, max_messages):
+    """
+    Yields batches of up to 10 DLQ messages until the queue is empty or
+    max_messages have been received.
+    """
+    received = 0
+    while not max_messages or received < max_messages:
+        response = sqs.receive_message(
+            QueueUrl=queue_url,
+            MaxNumberOfMessages=min(10, max_messages - received) if max_messages else 10,
+            WaitTimeSeconds=2,
+            VisibilityTimeout=RECEIVE_VISIBILITY_TIMEOUT,
+            AttributeNames=['SentTimestamp', 'ApproximateReceiveCount']
+        )
+        messages = response.get('Messages', [])
+        if not messages:
+            return
+        received += len(messages)
+        yield messages
+
+
+def parse_webhook(message):
+    """
+    Returns (order_id, event_type) for a webhook message, or (None, None) if the
+    body is not a webhook payload.
+    """
+    try:
+        payload = json.loads(message['Body'])
+        order_href = payload.get('resource_href')
+    except (ValueError, AttributeError):
+        return None, None
+    if not order_href:
+        return None, None
+    return order_href.split('/')[-1], payload.get('event_type')
+
+
+def find_pushed_orders(order_ids):
+    """
+    Returns the subset of order_ids whose ticket was ever pushed to AppSync.
+    A saved row alone is not enough: the row is committed before the push,
+    which is the step that fails during an AppSync outage. Later saves that
+    deliberately skip the push (the reconciler's) keep the marker.
+    """
+    pushed = set()
+    order_ids = list(order_ids)
+    for start in range(0, len(order_ids), 100):
+        keys = [{'OrderID': order_id} for order_id in order_ids[start:start + 100]]
+        request = {ORDERS_TABLE_NAME: {'Keys': keys, 'ProjectionExpression': 'OrderID, PushedVersion'}}
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for row in response['Responses'].get(ORDERS_TABLE_NAME, []):
+                if row.get('PushedVersion') is not None:
+                    pushed.add(row['OrderID'])
+            request = response.get('UnprocessedKeys')
+    return pushed
+
+
+def classify(messages, max_age_seconds):
+    """
+    Sorts a batch of messages into {classification: [(message, order_id)]}.
+    Duplicates are only looked for within the batch: an earlier batch's message
+    may have been replayed and dead-lettered again, and must not be dropped.
+    """
+    now_ms = time.time() * 1000
+    classified = {'processed': [], 'duplicate': [], 'stale': [], 'invalid': [], 'retryable': []}
+
+    webhooks = [parse_webhook(message) for message in messages]
+    order_ids = {order_id for order_id, _ in webhooks} - {None}
+    pushed = find_pushed_orders(order_ids) if order_ids else set()
+    seen_events = set()
+
+    for message, (order_id, event_type) in zip(messages, webhooks):
+        sent_ms = int(message.get('Attributes', {}).get('SentTimestamp', now_ms))
+
+        if order_id is None:
+            classification = 'invalid'
+        elif (order_id, event_type) in seen_events:
+            classification = 'duplicate'
+        elif order_id in pushed and event_type in NEW_ORDER_EVENT_TYPES:
+            classification = 'processed'
+        elif now_ms - sent_ms > max_age_seconds * 1000:
+            classification = 'stale'
+        else:
+            classification = 'retryable'
+
+        if order_id:
+            seen_events.add((order_id, event_type))
+        classified[classification].append((message, order_id))
+    return classified
+
+
+def delete_messages(queue_url, messages):
+    """Deletes messages from the DLQ, 10 per request."""
+    for start in range(0, len(messages), 10):
+        batch = messages[start:start + 10]
+        response = sqs.delete_message_batch(
+            QueueUrl=queue_url,
+            Entries=[{'Id': str(i), 'ReceiptHandle': m['ReceiptHandle']} for i, m in enumerate(batch)]
+        )
+        for failure in response.get('Failed', []):
+            print(f"Could not delete DLQ message: {failure}")
+
+
+def release_messages(queue_url, messages):
+    """Makes received messages visible in the DLQ again, 10 per request."""
+    for start in range(0, len(messages), 10):
+        batch = messages[start:start + 10]
+        sqs.change_message_visibility_batch(
+            QueueUrl=queue_url,
+            Entries=[{'Id': str(i), 'ReceiptHandle': m['ReceiptHandle'], 'VisibilityTimeout': 0}
+                     for i, m in enumerate(batch)]
+        )
+
+
+def make_replayer(target, main_queue_url):
+    """
+    Returns a function that replays one message body, either by invoking the
+    OrderProcessor in-process or by sending it back to the main queue.
+    """
+    if target == 'handler':
+        # Imported here: the processor reads its configuration from the
+        # environment at import time, which queue mode does not need.
+        import order_processor
+
+        def replay(body):
+            order_processor.handler({'Records': [{'body': body}]}, None)
+    else:
+        def replay(body):
+            sqs.send_message(QueueUrl=main_queue_url, MessageBody=body)
+    return replay
+
+
+def replay_dlq(args):
+    """
+    Drains the DLQ, classifies every message and replays the retryable ones.
+    Returns the summary report.
+    """
+    dlq_url = sqs.get_queue_url(QueueName=args.dlq_name)['QueueUrl']
+    main_queue_url = sqs.get_queue_url(QueueName=args.main_queue_name)['QueueUrl']
+    replay = None if args.dry_run else make_replayer(args.target, main_queue_url)
+    limiter = RateLimiter(args.rate)
+
+    report = {
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'target': args.target,
+        'dry_run': args.dry_run,
+        'counts': {'processed': 0, 'duplicate': 0, 'stale': 0, 'invalid': 0, 'retryable': 0},
+        'replayed': 0,
+        'failed': []
+    }
+    dry_run_messages = []
+    started = time.monotonic()
+
+    # Receiving continues while replays run; at most --concurrency are in
+    # flight, so one slow replay never holds up the rest of the drain.
+    in_flight = threading.BoundedSemaphore(args.concurrency)
+    report_lock = threading.Lock()
+
+    def replay_one(message, order_id):
+        try:
+            limiter.wait()
+            replay(message['Body'])
+            delete_messages(dlq_url, [message])
+            with report_lock:
+                report['replayed'] += 1
+        except Exception as e:
+            # Left in the DLQ: it becomes visible again once the timeout expires
+            print(f"Replay of order {order_id} failed: {e}")
+            with report_lock:
+                report['failed'].append({'order_id': order_id, 'error': str(e)})
+        finally:
+            in_flight.release()
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for messages in receive_batches(dlq_url, args.max_messages):
+            classified = classify(messages, args.max_age_hours * 3600)
+            for classification, entries in classified.items():
+                report['counts'][classification] += len(entries)
+            print(f"Batch of {len(messages)}: " + ", ".join(f"{k}={len(v)}" for k, v in classified.items()))
+
+            if args.dry_run:
+                dry_run_messages.extend(messages)
+                continue
+
+            droppable = classified['processed'] + classified['duplicate'] + classified['stale']
+            delete_messages(dlq_url, [message for message, _ in droppable])
+
+            for message, order_id in classified['retryable']:
+                in_flight.acquire()
+                executor.submit(replay_one, message, order_id)
+
+    # A dry run leaves the DLQ as it found it
+    release_messages(dlq_url, dry_run_messages)
+
+    report['duration_seconds'] = round(time.monotonic() - started, 2)
+    report['finished_at'] = datetime.now(timezone.utc).isoformat()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the order processing dead letter queue.")
+    parser.add_argument('--target', choices=['handler', 'queue'], default='queue',
+                        help="Replay through order_processor.handler in-process, or back onto the main queue")
+    parser.add_argument('--concurrency', type=int, default=4, help="Parallel replays")
+    parser.add_argument('--rate', type=float, default=2.0, help="Maximum replays per second (0 = unlimited)")
+    parser.add_argument('--max-age-hours', type=float, default=6.0,
+                        help="Messages older than this are classified as stale and dropped")
+    parser.add_argument('--max-messages', type=int, default=0, help="Stop after this many messages (0 = drain)")
+    parser.add_argument('--dlq-name', default=DLQ_NAME)
+    parser.add_argument('--main-queue-name', default=MAIN_QUEUE_NAME)
+    parser.add_argument('--report', default=f"dlq_replay_report_{datetime.now():%Y%m%d_%H%M%S}.json",
+                        help="Where to write the JSON summary report")
+    parser.add_argument('--dry-run', action='store_true', help="Classify only; do not replay or delete")
+    args = parser.parse_args()
+
+    report = replay_dlq(args)
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n✅ Replayed {report['replayed']} orders in {report['duration_seconds']}s: {json.dumps(report['counts'])}")
+    if report['failed']:
+        print(f"❌ {len(report['failed'])} replays failed and were left in the DLQ.")
+    print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import json
+import os
+import time
+import threading
+import boto3
+from collections import OrderedDict
+
+# Initialize AWS clients
+dynamodb = boto3.resource('dynamodb')
+
+# Get environment variables set by Terraform
+ORDER_CACHE_TABLE_NAME = os.environ.get('ORDER_CACHE_TABLE')
+ORDER_CACHE_TTL_SECONDS = int(os.environ.get('ORDER_CACHE_TTL_SECONDS', '7200'))
+ORDER_CACHE_MAX_LOCAL_ENTRIES = int(os.environ.get('ORDER_CACHE_MAX_LOCAL_ENTRIES', '256'))
+# Other containers never see this container's writes, so the in-memory tier
+# only bridges back-to-back deliveries and defers to the shared tier after that.
+ORDER_CACHE_LOCAL_TTL_SECONDS = int(os.environ.get('ORDER_CACHE_LOCAL_TTL_SECONDS', '10'))
+
+# Initialize DynamoDB Table resource
+order_cache_table = dynamodb.Table(ORDER_CACHE_TABLE_NAME)
+
+# In-memory tier, so back-to-back events for the same order never leave the process.
+_local_cache = OrderedDict()
+# Lambda is single-threaded, but the DLQ replay tool calls the handler from a thread pool
+_local_cache_lock = threading.Lock()
+
+
+def _remember_locally(order_id, entry, now):
+    local_expires_at = min(entry['ExpiresAt'], now + ORDER_CACHE_LOCAL_TTL_SECONDS)
+    with _local_cache_lock:
+        _local_cache[order_id] = {**entry, 'LocalExpiresAt': local_expires_at}
+        _local_cache.move_to_end(order_id)
+        while len(_local_cache) > ORDER_CACHE_MAX_LOCAL_ENTRIES:
+            _local_cache.popitem(last=False)
+
+
+def _recall_locally(order_id, now):
+    with _local_cache_lock:
+        entry = _local_cache.get(order_id)
+        if entry and entry['LocalExpiresAt'] > now:
+            _local_cache.move_to_end(order_id)
+            return entry
+        if entry:
+            del _local_cache[order_id]
+        return None
+
+
+def get_cached_order(order_id):
+    """
+    Looks up an order in the in-memory tier, then the shared DynamoDB tier.
+    Returns a dict with 'Fingerprint' (of the cart it was built from) and 'Items'
+    (the filtered back-of-house ticket), or None on a miss or an expired entry.
+    Entries are only written once an order has been saved and pushed, so a hit
+    means the order has already reached the kitchen.
+    """
+    now = time.time()
+
+    entry = _recall_locally(order_id, now)
+    if entry:
+        print(f"Order cache hit (memory) for order {order_id}.")
+        return entry
+
+    try:
+        cached_item = order_cache_table.get_item(Key={'OrderID': order_id}).get('Item')
+    except Exception as e:
+        print(f"Could not read from order cache: {e}")
+        return None
+
+    # DynamoDB TTL deletion is lazy, so expiry has to be checked here as well.
+    if not cached_item or cached_item.get('ExpiresAt') <= now:
+        return None
+
+    entry = {
+        'Fingerprint': cached_item['Fingerprint'],
+        'Items': json.loads(cached_item['Items']),
+        'ExpiresAt': int(cached_item['ExpiresAt'])
+    }
+    _remember_locally(order_id, entry, now)
+    print(f"Order cache hit (shared) for order {order_id}.")
+    return entry
+
+
+def put_cached_order(order_id, fingerprint, items, items_json):
+    """
+    Stores the filtered back-of-house ticket of a processed order in both tiers,
+    with the fingerprint of the cart it was built from. items_json is the
+    ticket's existing encoding of items. Failing to write the shared tier is
+    logged, never raised, since the cache is only an optimisation.
+    """
+    now = int(time.time())
+    entry = {
+        'Fingerprint': fingerprint,
+        'Items': items,
+        'ExpiresAt': now + ORDER_CACHE_TTL_SECONDS
+    }
+    _remember_locally(order_id, entry, now)
+
+    try:
+        order_cache_table.put_item(
+            Item={
+                'OrderID': order_id,
+                'Fingerprint': fingerprint,
+                'Items': items_json,
+                'ExpiresAt': entry['ExpiresAt']
+            }
+        )
+    except Exception as e:
+        print(f"Could not write to order cache: {e}")
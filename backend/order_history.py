@@ -0,0 +1,152 @@
+import json
+import os
+import base64
+import boto3
+from datetime import datetime, timedelta, timezone
+from boto3.dynamodb.conditions import Key
+import order_model
+
+# Initialize AWS clients
+dynamodb = boto3.resource('dynamodb')
+
+# Get environment variables set by Terraform
+ORDERS_TABLE_NAME = os.environ.get('ORDERS_TABLE')
+
+# Initialize DynamoDB Table resource
+orders_table = dynamodb.Table(ORDERS_TABLE_NAME)
+
+HISTORY_INDEX_NAME = 'StoreDay-CreatedAt-index'
+
+# Only the fields the History page shows are read back from the index.
+HISTORY_FIELDS = ['OrderID', 'DisplayID', 'State', 'Items', 'SpecialInstructions', 'CreatedAt']
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+# Every day in the range is its own partition, so the range is bounded to keep
+# a page of sparse history from turning into hundreds of empty queries.
+MAX_RANGE_DAYS = 93
+
+
+def format_timestamp(moment):
+    """Formats a datetime as the UTC ISO-8601 string stored in CreatedAt (sorts lexically)."""
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def parse_timestamp(value):
+    """Parses an ISO-8601 timestamp (Uber's or AppSync's AWSDateTime) into an aware UTC datetime."""
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def store_day(store_id, moment):
+    """Partition key of the history index: one partition per store per UTC day."""
+    return f"{store_id}#{moment.astimezone(timezone.utc).strftime('%Y-%m-%d')}"
+
+
+def history_keys(order_details):
+    """
+    Returns the StoreDay and CreatedAt attributes for an Uber order, using the
+    time the order was placed and falling back to now if Uber did not send one.
+    Returns no attributes if the payload has no store, since no history query
+    could ever reach the order.
+    """
+    store_id = (order_details.get('store') or {}).get('id')
+    if not store_id:
+        print(f"Warning: Order {order_details.get('id')} has no store ID. Leaving it out of the history index.")
+        return {}
+
+    placed_at = order_details.get('placed_at')
+    try:
+        moment = parse_timestamp(placed_at) if placed_at else datetime.now(timezone.utc)
+    except ValueError:
+        print(f"Warning: Could not parse placed_at '{placed_at}'. Using the current time.")
+        moment = datetime.now(timezone.utc)
+
+    return {
+        'StoreDay': store_day(store_id, moment),
+        'CreatedAt': format_timestamp(moment)
+    }
+
+
+def _encode_cursor(day, last_key):
+    cursor = {'Day': day.strftime('%Y-%m-%d'), 'Key': last_key}
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(token):
+    cursor = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    day = datetime.strptime(cursor['Day'], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    return day, cursor.get('Key')
+
+
+def query_order_history(store_id, start, end, limit=DEFAULT_PAGE_SIZE, next_token=None):
+    """
+    Returns one page of a store's orders placed between start and end, newest
+    first, plus a cursor for the next page (None on the last page).
+
+    Each page reads only the day partitions it walks through, so the cost
+    depends on the page size and the range, never on the size of the table.
+    """
+    limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+    first_day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    if (end - first_day).days > MAX_RANGE_DAYS:
+        raise ValueError(f"History range cannot exceed {MAX_RANGE_DAYS} days.")
+
+    if next_token:
+        day, last_key = _decode_cursor(next_token)
+    else:
+        day, last_key = end.replace(hour=0, minute=0, second=0, microsecond=0), None
+
+    orders = []
+    while day >= first_day:
+        query_args = {
+            'IndexName': HISTORY_INDEX_NAME,
+            'KeyConditionExpression': Key('StoreDay').eq(store_day(store_id, day)) &
+                                      Key('CreatedAt').between(format_timestamp(start), format_timestamp(end)),
+            'ProjectionExpression': ', '.join(f'#{field}' for field in HISTORY_FIELDS),
+            'ExpressionAttributeNames': {f'#{field}': field for field in HISTORY_FIELDS},
+            'ScanIndexForward': False,
+            'Limit': limit - len(orders)
+        }
+        if last_key:
+            query_args['ExclusiveStartKey'] = last_key
+
+        response = orders_table.query(**query_args)
+        orders.extend(response['Items'])
+        last_key = response.get('LastEvaluatedKey')
+
+        if not last_key:
+            day -= timedelta(days=1)
+        if len(orders) >= limit:
+            break
+
+    next_cursor = _encode_cursor(day, last_key) if day >= first_day else None
+    return orders, next_cursor
+
+
+def handler(event, context):
+    """
+    AppSync Lambda resolver for the getOrderHistory query.
+    """
+    print(f"Received event: {json.dumps(event)}")
+    args = event.get('arguments', {})
+
+    orders, next_token = query_order_history(
+        args['StoreID'],
+        parse_timestamp(args['From']),
+        parse_timestamp(args['To']),
+        limit=args.get('Limit'),
+        next_token=args.get('NextToken')
+    )
+
+    # Items is an AWSJSON field, so it is handed back as a JSON string
+    for order in orders:
+        order['Items'] = order_model.dumps(order.get('Items', []))
+
+    print(f"Returning {len(orders)} orders for store {args['StoreID']}.")
+    return {
+        'Orders': json.loads(order_model.dumps(orders)),
+        'NextToken': next_token
+    }
@@ -0,0 +1,234 @@
+import json
+import hashlib
+from decimal import Decimal
+
+# orjson is several times faster than the standard library on large carts.
+# It is optional: without it the same output is produced with json.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Menu locations that need kitchen preparation
+BACK_OF_HOUSE_LOCATIONS = ('back', 'both')
+
+
+def _default(value):
+    # DynamoDB hands numbers back as Decimal
+    if isinstance(value, Decimal):
+        return int(value) if value % 1 == 0 else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value, sort_keys=False):
+    """
+    Encodes a value as compact JSON text. Shared by the AppSync request, the
+    order cache and the logs so every structure is encoded the same way.
+    sort_keys gives a canonical encoding for hashing.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_SORT_KEYS if sort_keys else 0).decode('utf-8')
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False, sort_keys=sort_keys, default=_default)
+
+
+def cart_fingerprint(cart):
+    """
+    Returns a stable hash of the cart contents. Two fetches of the same order
+    with an unchanged cart produce the same fingerprint, whatever the key order.
+    """
+    return hashlib.sha256(dumps(cart or {}, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class UberModifier:
+    __slots__ = ('uber_id', 'title', 'quantity')
+
+    def __init__(self, uber_id, title, quantity):
+        self.uber_id = uber_id
+        self.title = title
+        self.quantity = quantity
+
+
+class UberItem:
+    __slots__ = ('uber_id', 'title', 'quantity', 'special_instructions', 'modifiers')
+
+    def __init__(self, uber_id, title, quantity, special_instructions, modifiers):
+        self.uber_id = uber_id
+        self.title = title
+        self.quantity = quantity
+        self.special_instructions = special_instructions
+        self.modifiers = modifiers
+
+
+class UberOrder:
+    """
+    The parts of an Uber order payload that PrepDeck uses, read in one pass.
+    The raw cart is kept for fingerprinting.
+    """
+    __slots__ = ('order_id', 'display_id', 'store_id', 'state', 'special_instructions', 'items', 'cart')
+
+    def __init__(self, order_id, display_id, store_id, state, special_instructions, items, cart):
+        self.order_id = order_id
+        self.display_id = display_id
+        self.store_id = store_id
+        self.state = state
+        self.special_instructions = special_instructions
+        self.items = items
+        self.cart = cart
+
+    @classmethod
+    def from_payload(cls, payload):
+        cart = payload.get('cart') or {}
+        items = []
+        for item in cart.get('items') or ():
+            modifiers = [
+                UberModifier(modifier.get('id'), modifier.get('title'), modifier.get('quantity', 1))
+                for group in item.get('selected_modifier_groups') or ()
+                for modifier in group.get('selected_items') or ()
+            ]
+            items.append(UberItem(
+                item.get('id'),
+                item.get('title'),
+                item.get('quantity', 1),
+                item.get('special_instructions', ''),
+                modifiers
+            ))
+
+        return cls(
+            payload.get('id'),
+            payload.get('display_id'),
+            (payload.get('store') or {}).get('id'),
+            payload.get('current_state'),
+            cart.get('special_instructions', ''),
+            items,
+            cart
+        )
+
+
+class TicketModifier:
+    __slots__ = ('title', 'sku', 'quantity')
+
+    def __init__(self, title, sku, quantity):
+        self.title = title
+        self.sku = sku
+        self.quantity = quantity
+
+    def to_dict(self):
+        return {'Title': self.title, 'InternalSKU': self.sku, 'Quantity': self.quantity}
+
+
+class TicketItem:
+    __slots__ = ('title', 'sku', 'quantity', 'special_instructions', 'modifiers')
+
+    def __init__(self, title, sku, quantity, special_instructions, modifiers):
+        self.title = title
+        self.sku = sku
+        self.quantity = quantity
+        self.special_instructions = special_instructions
+        self.modifiers = modifiers
+
+    def to_dict(self):
+        return {
+            'Title': self.title,
+            'InternalSKU': self.sku,
+            'Quantity': self.quantity,
+            'SpecialInstructions': self.special_instructions,
+            'Modifiers': [modifier.to_dict() for modifier in self.modifiers]
+        }
+
+    @classmethod
+    def from_dict(cls, item):
+        return cls(
+            item['Title'],
+            item['InternalSKU'],
+            item['Quantity'],
+            item.get('SpecialInstructions', ''),
+            [TicketModifier(m['Title'], m['InternalSKU'], m['Quantity']) for m in item.get('Modifiers', [])]
+        )
+
+
+def menu_title(menu_item, fallback):
+    """Kitchen-facing name: Mandarin first, then the menu name, then Uber's title."""
+    return menu_item.get('name_mandarin', menu_item.get('ItemName', fallback))
+
+
+def filter_back_of_house_items(items, lookup_menu_item):
+    """
+    Builds ticket items for the UberItems whose menu Location is 'back' or
+    'both', with ALL their modifiers. lookup_menu_item(uber_id) returns the
+    menu row for an Uber ID, or None if it is not on the menu.
+    """
+    ticket_items = []
+    for item in items:
+        menu_item = lookup_menu_item(item.uber_id)
+        if menu_item is None:
+            print(f"Warning: Main item {item.uber_id} not found in menu_table.")
+            continue
+        if menu_item.get('Location') not in BACK_OF_HOUSE_LOCATIONS:
+            continue
+
+        modifiers = []
+        for modifier in item.modifiers:
+            modifier_item = lookup_menu_item(modifier.uber_id)
+            if modifier_item is None:
+                print(f"Warning: Modifier item {modifier.uber_id} not found in menu_table.")
+                continue
+            modifiers.append(TicketModifier(
+                menu_title(modifier_item, modifier.title),
+                modifier_item.get('ItemID'),
+                modifier.quantity
+            ))
+
+        ticket_items.append(TicketItem(
+            menu_title(menu_item, item.title),
+            menu_item.get('ItemID'),
+            item.quantity,
+            item.special_instructions,
+            modifiers
+        ))
+    return ticket_items
+
+
+class Ticket:
+    """
+    The filtered back-of-house ticket for an order. The item dicts and their
+    JSON encoding are built once and shared by the Orders table write, the
+    AppSync AWSJSON field, the order cache and the logs.
+    """
+    __slots__ = ('order', 'items', '_items_dicts', '_items_json')
+
+    def __init__(self, order, items):
+        self.order = order
+        self.items = items
+        self._items_dicts = None
+        self._items_json = None
+
+    def items_dicts(self):
+        if self._items_dicts is None:
+            self._items_dicts = [item.to_dict() for item in self.items]
+        return self._items_dicts
+
+    def items_json(self):
+        if self._items_json is None:
+            self._items_json = dumps(self.items_dicts())
+        return self._items_json
+
+    def to_item(self):
+        """The Orders table item (without the keys added at save time)."""
+        return {
+            'OrderID': self.order.order_id,
+            'DisplayID': self.order.display_id,
+            'StoreID': self.order.store_id,
+            'State': self.order.state,
+            'Items': self.items_dicts(),
+            'SpecialInstructions': self.order.special_instructions
+        }
+
+    def appsync_input(self):
+        """The OrderInput for the newOrder mutation; Items is AWSJSON."""
+        return {
+            'OrderID': self.order.order_id,
+            'DisplayID': self.order.display_id,
+            'State': self.order.state,
+            'Items': self.items_json(),
+            'SpecialInstructions': self.order.special_instructions
+        }
@@ -7,6 +7,10 @@ from botocore.auth import SigV4Auth
 from botocore.awsrequest import AWSRequest
 from datetime import datetime
 from boto3.dynamodb.conditions import Key
+import order_cache
+import all_day_counts
+import order_history
+import order_model
 
 # Initialize AWS clients
 ssm = boto3.client('ssm')
@@ -28,6 +32,15 @@ token_cache_table = dynamodb.Table(TOKEN_CACHE_TABLE_NAME)
 menu_table = dynamodb.Table(MENU_TABLE_NAME)
 orders_table = dynamodb.Table(ORDERS_TABLE_NAME)
 
+# Webhook event types that mean the order changed on Uber's side. These are
+# always refetched and saved, even for an order that is already cached.
+ORDER_MODIFIED_EVENT_TYPES = {
+    'orders.cancel',
+    'orders.failure',
+    'orders.release',
+    'orders.fulfillment_issues.resolved'
+}
+
 def get_uber_eats_token():
     """
     Retrieves a valid Uber Eats API token, using a cache to avoid rate limits.
@@ -114,13 +127,33 @@ def accept_uber_eats_order(order_id, auth_token, ready_for_pickup_time=None, ext
         print(f"Generic error accepting order {order_id}: {e}")
         return False
 
-def push_order_to_appsync(order_data):
+def post_to_appsync(payload):
+    """
+    Signs a GraphQL request with the Lambda's IAM credentials and posts it to AppSync.
+    """
+    request = AWSRequest(
+        method="POST",
+        url=APPSYNC_API_URL,
+        data=order_model.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json'}
+    )
+    SigV4Auth(credentials, "appsync", AWS_REGION).add_auth(request)
+
+    response = requests.post(APPSYNC_API_URL, headers=dict(request.headers), data=request.data)
+    
+    print(f"AppSync Response Status: {response.status_code}")
+    
+    response.raise_for_status()
+    return response.json()
+
+def push_order_to_appsync(ticket):
     """
     Signs and sends a GraphQL mutation to the AppSync API.
     Returns the response data for logging.
     """
     print(f"=== APPSYNC PUSH START ===")
-    print(f"Pushing order to AppSync: {json.dumps(order_data)}")
+    # items_json() is encoded once and reused for the mutation below
+    print(f"Pushing order {ticket.order.order_id} to AppSync: {ticket.items_json()}")
     
     mutation = """
         mutation NewOrder($order: OrderInput!) {
@@ -134,44 +167,22 @@ def push_order_to_appsync(order_data):
         }
     """
     
-    # Convert Items to JSON string since it's AWSJSON type
-    order_input = {
-        "OrderID": order_data["OrderID"],
-        "DisplayID": order_data["DisplayID"],
-        "State": order_data["State"],
-        "Items": json.dumps(order_data["Items"]),
-        "SpecialInstructions": order_data["SpecialInstructions"]
-    }
-    
     payload = {
         "query": mutation,
         "variables": {
-            "order": order_input
+            "order": ticket.appsync_input()
         }
     }
 
-    request = AWSRequest(
-        method="POST",
-        url=APPSYNC_API_URL,
-        data=json.dumps(payload),
-        headers={'Content-Type': 'application/json'}
-    )
-    SigV4Auth(credentials, "appsync", AWS_REGION).add_auth(request)
-
-    response = requests.post(APPSYNC_API_URL, headers=dict(request.headers), data=request.data)
-    
-    print(f"AppSync Response Status: {response.status_code}")
-    
-    response.raise_for_status()
-    response_data = response.json()
+    response_data = post_to_appsync(payload)
     
     # Check if there were any errors
     if 'errors' in response_data:
-        print(f"⚠️  AppSync returned errors: {json.dumps(response_data['errors'])}")
+        print(f"⚠️  AppSync returned errors: {order_model.dumps(response_data['errors'])}")
     
     # Check if data was successfully sent
     if 'data' in response_data and response_data['data'] and response_data['data'].get('newOrder'):
-        print(f"✅ Successfully pushed order {order_data['OrderID']} to AppSync!")
+        print(f"✅ Successfully pushed order {ticket.order.order_id} to AppSync!")
     else:
         print(f"⚠️  AppSync mutation returned None")
     
@@ -180,14 +191,157 @@ def push_order_to_appsync(order_data):
     return response_data
 
 
+def mark_order_pushed(order_id, version):
+    """
+    Records on the Orders row that this version of the ticket reached AppSync,
+    so the DLQ replay tool can tell a delivered order from one that was only
+    saved. Later saves carry the marker over; a newer save in the meantime
+    leaves it at the previous pushed version.
+    """
+    try:
+        orders_table.update_item(
+            Key={'OrderID': order_id},
+            UpdateExpression='SET PushedVersion = :version',
+            ConditionExpression='Version = :version',
+            ExpressionAttributeValues={':version': version}
+        )
+    except Exception as e:
+        print(f"Could not mark order {order_id} as pushed: {e}")
+
+
+def push_all_day_counts_to_appsync(store_id, counts):
+    """
+    Publishes the new all-day totals of the SKUs an order changed, so line cooks
+    see them update without re-reading the aggregate. Failures are logged, never
+    raised: the totals are already saved, and a retry would push the ticket again.
+    """
+    mutation = """
+        mutation UpdateAllDayCounts($counts: AllDayCountsInput!) {
+            updateAllDayCounts(counts: $counts) {
+                StoreID
+                Counts
+            }
+        }
+    """
+
+    payload = {
+        "query": mutation,
+        "variables": {
+            "counts": {
+                "StoreID": store_id,
+                "Counts": order_model.dumps(counts)
+            }
+        }
+    }
+
+    try:
+        response_data = post_to_appsync(payload)
+    except Exception as e:
+        print(f"Could not push all-day counts for store {store_id}: {e}")
+        return None
+    if 'errors' in response_data:
+        print(f"⚠️  AppSync returned errors for all-day counts: {order_model.dumps(response_data['errors'])}")
+
+    return response_data
+
+
+def menu_lookup():
+    """
+    Returns a lookup from Uber item ID to menu row that queries the
+    UberEatsID-index GSI at most once per ID, since the same item and modifier
+    IDs repeat throughout a large cart.
+    """
+    menu_items = {}
+
+    def lookup_menu_item(uber_id):
+        if uber_id not in menu_items:
+            response = menu_table.query(
+                IndexName='UberEatsID-index', 
+                KeyConditionExpression=Key('UberEatsID').eq(uber_id)
+            )
+            menu_items[uber_id] = response['Items'][0] if response['Items'] else None
+        return menu_items[uber_id]
+
+    return lookup_menu_item
+
+
+def process_order_details(order_id, order_details, cached_order=None, push_to_kitchen=True, fingerprint=None):
+    """
+    Filters an order's cart down to its back-of-house items, saves the ticket and
+    pushes it to the frontend. cached_order is the order cache entry, if any, so
+    an unchanged cart skips the menu lookups. With push_to_kitchen=False the
+    ticket is only saved, for a kitchen that already has it; closed orders are
+    never pushed. fingerprint is the cart fingerprint, if the caller already has
+    it. The order is cached only once it has been saved and pushed.
+    Returns the saved ticket, or None if the order was not saved.
+    """
+    # Step 4: Apply business logic - Enrich and filter for back-of-house items.
+    # The payload is parsed once; an unchanged cart reuses the cached ticket.
+    order = order_model.UberOrder.from_payload(order_details)
+    fingerprint = fingerprint or order_model.cart_fingerprint(order.cart)
+    if cached_order and cached_order['Fingerprint'] == fingerprint:
+        print("Step 4: Cart unchanged, reusing cached back-of-house items...")
+        ticket = order_model.Ticket(order, [order_model.TicketItem.from_dict(item) for item in cached_order['Items']])
+    else:
+        print("Step 4: Filtering for back-of-house items...")
+        ticket = order_model.Ticket(order, order_model.filter_back_of_house_items(order.items, menu_lookup()))
+
+    # Step 5: Save the ticket and, if back-of-house items were found, push it to the frontend
+    if ticket.items:
+        print(f"Found {len(ticket.items)} back-of-house items for order {order_id}.")
+    else:
+        print(f"No back-of-house items found for order {order_id}.")
+
+    filtered_order = {
+        **ticket.to_item(),
+        # Lets the reconciler spot a cart that changed without a webhook
+        'CartFingerprint': fingerprint,
+        # StoreDay/CreatedAt key the time-ordered history index
+        **order_history.history_keys(order_details)
+    }
+
+    # Save the filtered order to our Orders table, updating the store's
+    # all-day item counts in the same transaction. An order that has no
+    # back-of-house items is only saved if an earlier ticket of it was, so
+    # that ticket's counts are taken back out.
+    print("Saving filtered order to DynamoDB...")
+    count_updates = all_day_counts.save_order_with_counts(filtered_order, save_if_new=bool(ticket.items))
+
+    if count_updates is None:
+        print(f"Order {order_id} accepted but not pushed to frontend.")
+        filtered_order = None
+    else:
+        if not ticket.items:
+            print(f"Order {order_id} no longer has back-of-house items. Not pushing it to the frontend.")
+        elif not all_day_counts.is_open_order(filtered_order):
+            # The dashboard appends every newOrder as a new ticket, so a closed
+            # order (including one kept closed over Uber's older copy) is not pushed.
+            print(f"Order {order_id} is {filtered_order['State']}. Not pushing it to the frontend.")
+        elif not push_to_kitchen:
+            print(f"Order {order_id} is already on the kitchen screen. Saved without pushing.")
+        else:
+            # Push to AppSync for real-time frontend updates
+            print("Step 5: Pushing to AppSync...")
+            appsync_response = push_order_to_appsync(ticket)
+            if (appsync_response.get('data') or {}).get('newOrder'):
+                mark_order_pushed(order_id, filtered_order['Version'])
+        if count_updates:
+            push_all_day_counts_to_appsync(order.store_id or filtered_order.get('StoreID'), count_updates)
+
+    order_cache.put_cached_order(order_id, fingerprint, ticket.items_dicts(), ticket.items_json())
+    print(f"Order {order_id} processing complete.")
+    return filtered_order
+
+
 def handler(event, context):
     """
     This function is triggered by SQS. It processes orders in the following sequence:
     1. Get auth token (from cache or Uber)
     2. Accept the order immediately
     3. Fetch full order details
-    4. Apply business logic (filter items and ALL modifiers)
+    4. Apply business logic (filter items and ALL modifiers), skipped when the cart is unchanged
     5. Push to frontend via AppSync if applicable
+    Repeat deliveries of an order that is already in the order cache are skipped.
     """
     print(f"Received event: {json.dumps(event)}")
     
@@ -203,6 +357,16 @@ def handler(event, context):
         order_id = order_href.split('/')[-1]
         
         try:
+            # A cached order has already been saved and pushed, so a repeat
+            # delivery of the same event needs nothing from Uber. Events that
+            # mean the order changed are always refetched; the cached ticket
+            # is still reused below if the cart did not change.
+            event_type = webhook_payload.get('event_type')
+            cached_order = order_cache.get_cached_order(order_id)
+            if cached_order and event_type not in ORDER_MODIFIED_EVENT_TYPES:
+                print(f"Order {order_id} was already processed. Skipping {event_type} event.")
+                continue
+
             # Step 1: Get authentication token
             print("Step 1: Getting authentication token...")
             auth_token = get_uber_eats_token()
@@ -220,88 +384,15 @@ def handler(event, context):
             order_response.raise_for_status()
             order_details = order_response.json()
             
-            print(f"Full order details fetched: {json.dumps(order_details)}")
-            
-            # Step 4: Apply business logic - Enrich and filter for back-of-house items
-            print("Step 4: Filtering for back-of-house items...")
-            back_of_house_items = []
+            # Log the body as received rather than re-encoding the parsed payload
+            print(f"Full order details fetched: {order_response.text}")
             
-            cart = order_details.get("cart", {})
-            if cart:
-                for item in cart.get("items", []):
-                    # Query the GSI for the MAIN item
-                    response = menu_table.query(
-                        IndexName='UberEatsID-index', 
-                        KeyConditionExpression=Key('UberEatsID').eq(item.get('id'))
-                    )
-                    
-                    if response['Items']:
-                        menu_item = response['Items'][0]
-                        
-                        # Check if the item's location is 'back' or 'both'
-                        if menu_item.get('Location') in ['back', 'both']:
-                            
-                            # Build the main item object
-                            processed_item = {
-                                'Title': menu_item.get('name_mandarin', menu_item.get('ItemName', item.get('title'))),
-                                'InternalSKU': menu_item.get('ItemID'),
-                                'Quantity': item.get('quantity', 1),
-                                'SpecialInstructions': item.get('special_instructions', ''), 
-                                'Modifiers': []
-                            }
-
-                            # --- Process ALL Modifiers ---
-                            if item.get('selected_modifier_groups'):
-                                for group in item.get('selected_modifier_groups'):
-                                    for modifier in group.get('selected_items', []): 
-                                        # Query the GSI for the MODIFIER item
-                                        modifier_response = menu_table.query(
-                                            IndexName='UberEatsID-index', 
-                                            KeyConditionExpression=Key('UberEatsID').eq(modifier.get('id'))
-                                        )
-                                        
-                                        if modifier_response['Items']:
-                                            modifier_item_details = modifier_response['Items'][0]
-                                            
-                                            # Add this modifier to the list
-                                            processed_item['Modifiers'].append({
-                                                'Title': modifier_item_details.get('name_mandarin', modifier_item_details.get('ItemName', modifier.get('title'))),
-                                                'InternalSKU': modifier_item_details.get('ItemID'),
-                                                'Quantity': modifier.get('quantity', 1)
-                                            })
-                                        else:
-                                            print(f"Warning: Modifier item {modifier.get('id')} not found in menu_table.")
-                            
-                            back_of_house_items.append(processed_item)
-                            
-                    else:
-                        print(f"Warning: Main item {item.get('id')} not found in menu_table.")
-
-            # Step 5: If back-of-house items found, save and push to frontend
-            if back_of_house_items:
-                print(f"Found {len(back_of_house_items)} back-of-house items for order {order_id}.")
-                
-                cart_special_instructions = cart.get('special_instructions', '')
-                
-                filtered_order = {
-                    'OrderID': order_details.get('id'),
-                    'DisplayID': order_details.get('display_id'),
-                    'State': order_details.get('current_state'), 
-                    'Items': back_of_house_items,
-                    'SpecialInstructions': cart_special_instructions
-                }
-                
-                # Save the filtered order to our Orders table
-                print("Saving filtered order to DynamoDB...")
-                orders_table.put_item(Item=filtered_order)
-                
-                # Push to AppSync for real-time frontend updates
-                print("Step 5: Pushing to AppSync...")
-                appsync_response = push_order_to_appsync(filtered_order)
-                
-                print(f"Order {order_id} processing complete.")
-            else:
-                print(f"No back-of-house items found for order {order_id}. Order accepted but not pushed to frontend.")
+            # Steps 4 & 5: Filter, save and push to the frontend. The kitchen
+            # already shows a cached ticket whose cart did not change.
+            fingerprint = order_model.cart_fingerprint(order_details.get('cart'))
+            cart_unchanged = bool(cached_order) and cached_order['Fingerprint'] == fingerprint
+            process_order_details(order_id, order_details, cached_order,
+                                  push_to_kitchen=not cart_unchanged, fingerprint=fingerprint)
 
         except Exception as e:
             print(f"Failed to process order {order_href}. Error: {e}")
@@ -0,0 +1,281 @@
+import json
+import os
+import boto3
+import requests
+from datetime import datetime, timedelta, timezone
+from boto3.dynamodb.conditions import Attr, Key
+
+import order_cache
+import order_history
+import order_model
+import order_processor
+
+# Initialize AWS clients
+dynamodb = boto3.resource('dynamodb')
+cloudwatch = boto3.client('cloudwatch')
+
+# Get environment variables set by Terraform
+INTEGRATION_TABLE_NAME = os.environ.get('INTEGRATION_TABLE_NAME')
+ORDERS_TABLE_NAME = os.environ.get('ORDERS_TABLE')
+
+# Initialize DynamoDB Table resources
+integration_table = dynamodb.Table(INTEGRATION_TABLE_NAME)
+orders_table = dynamodb.Table(ORDERS_TABLE_NAME)
+
+# Uber API endpoints
+UBER_STORE_ORDERS_URL_TEMPLATE = "https://api.uber.com/v1/delivery/store/{store_id}/orders"
+UBER_ORDER_URL_TEMPLATE = "https://api.uber.com/v1/delivery/order/{order_id}"
+
+# Orders the kitchen may still have to cook. Listed with their carts expanded,
+# so an order that is already in sync costs no extra API call.
+ACTIVE_ORDER_STATES = ('OFFERED', 'ACCEPTED')
+PAGE_SIZE = 50
+
+# Saved orders still open after this many UTC days are not looked for; a
+# delivery order is long finished by then.
+OPEN_ORDER_LOOKBACK_DAYS = 2
+
+METRICS_NAMESPACE = "PrepDeck/Reconciler"
+
+
+def get_uber_store_ids():
+    """
+    Returns the Uber store IDs of every connected integration
+    (integrationId is stored as "uber-{store_id}").
+    """
+    store_ids = set()
+    scan_args = {
+        'ProjectionExpression': 'integrationId',
+        'FilterExpression': Attr('integrationId').begins_with('uber-')
+    }
+    while True:
+        page = integration_table.scan(**scan_args)
+        store_ids.update(row['integrationId'][len('uber-'):] for row in page['Items'])
+        if 'LastEvaluatedKey' not in page:
+            return sorted(store_ids)
+        scan_args['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+
+def list_active_orders(store_id, auth_token):
+    """
+    Lists a store's active orders, following Uber's pagination tokens.
+    """
+    headers = {'Authorization': f'Bearer {auth_token}'}
+    params = {'state': ','.join(ACTIVE_ORDER_STATES), 'expand': 'carts', 'page_size': PAGE_SIZE}
+    orders = []
+    while True:
+        response = requests.get(UBER_STORE_ORDERS_URL_TEMPLATE.format(store_id=store_id), headers=headers, params=params)
+        response.raise_for_status()
+        body = response.json()
+        orders.extend(body.get('data') or [])
+
+        next_page_token = (body.get('pagination_data') or {}).get('next_page_token')
+        if not next_page_token:
+            return orders
+        params['next_page_token'] = next_page_token
+
+
+def fetch_order(order_id, auth_token):
+    """Fetches the full details of one order from Uber."""
+    headers = {'Authorization': f'Bearer {auth_token}'}
+    response = requests.get(UBER_ORDER_URL_TEMPLATE.format(order_id=order_id), headers=headers)
+    response.raise_for_status()
+    return response.json()
+
+
+def get_saved_orders(order_ids):
+    """
+    Reads the saved version of each order from the Orders table in batches.
+    Returns {OrderID: {'State', 'CartFingerprint'}} for the orders that exist.
+    """
+    saved = {}
+    for start in range(0, len(order_ids), 100):
+        keys = [{'OrderID': order_id} for order_id in order_ids[start:start + 100]]
+        request = {
+            ORDERS_TABLE_NAME: {
+                'Keys': keys,
+                'ProjectionExpression': 'OrderID, #state, CartFingerprint',
+                'ExpressionAttributeNames': {'#state': 'State'}
+            }
+        }
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for row in response['Responses'].get(ORDERS_TABLE_NAME, []):
+                saved[row['OrderID']] = row
+            request = response.get('UnprocessedKeys')
+    return saved
+
+
+def get_open_saved_orders(store_id):
+    """
+    Returns the IDs of a store's saved orders that are still open, read from the
+    history index for the last OPEN_ORDER_LOOKBACK_DAYS days.
+    """
+    today = datetime.now(timezone.utc)
+    order_ids = set()
+    for days_ago in range(OPEN_ORDER_LOOKBACK_DAYS):
+        query_args = {
+            'IndexName': order_history.HISTORY_INDEX_NAME,
+            'KeyConditionExpression': Key('StoreDay').eq(order_history.store_day(store_id, today - timedelta(days=days_ago))),
+            'FilterExpression': Attr('State').is_in(list(ACTIVE_ORDER_STATES)),
+            'ProjectionExpression': 'OrderID'
+        }
+        while True:
+            page = orders_table.query(**query_args)
+            order_ids.update(row['OrderID'] for row in page['Items'])
+            if 'LastEvaluatedKey' not in page:
+                break
+            query_args['ExclusiveStartKey'] = page['LastEvaluatedKey']
+    return order_ids
+
+
+def find_discrepancy(order, saved_order):
+    """
+    Compares an order listed by Uber with what we have. Returns 'missing' (the
+    kitchen never got it), 'stale' (the cart changed), 'state' (only the state
+    changed) or None when the kitchen already has the current version.
+    """
+    order_id = order.get('id')
+    # Carts are only compared when the listing included one
+    fingerprint = order_model.cart_fingerprint(order.get('cart') or {}) if 'cart' in order else None
+
+    if saved_order is None:
+        # Orders without back-of-house items are never saved; the order cache
+        # remembers that they were processed. A cached ticket with items but no
+        # saved row means the save failed, so the order is still missing.
+        cached_order = order_cache.get_cached_order(order_id)
+        if cached_order and not cached_order['Items'] and fingerprint in (None, cached_order['Fingerprint']):
+            return None
+        return 'missing'
+
+    # Rows saved before CartFingerprint existed are only compared on state
+    if fingerprint and saved_order.get('CartFingerprint') not in (None, fingerprint):
+        return 'stale'
+    if saved_order.get('State') != order.get('current_state'):
+        return 'state'
+    return None
+
+
+def repair_order(order, auth_token, push_to_kitchen=True):
+    """
+    Pushes a missing or out-of-date order through the normal OrderProcessor path.
+    With push_to_kitchen=False the order is only re-saved, for a kitchen that
+    already shows it.
+    """
+    order_id = order.get('id')
+    order_details = order
+    if 'cart' not in order_details:
+        # The listing did not include the cart: fall back to the full order.
+        order_details = fetch_order(order_id, auth_token)
+
+    # A lost webhook also means the order was never accepted. The payload still
+    # says OFFERED, so the accepted state is saved rather than Uber's old one.
+    if order_details.get('current_state') == 'OFFERED':
+        if order_processor.accept_uber_eats_order(order_id, auth_token):
+            order_details = {**order_details, 'current_state': 'ACCEPTED'}
+
+    order_processor.process_order_details(order_id, order_details, order_cache.get_cached_order(order_id),
+                                          push_to_kitchen=push_to_kitchen)
+
+
+def close_out_order(order_id, auth_token):
+    """
+    Re-saves a saved open order that Uber no longer lists as active, typically
+    one that was cancelled or finished while its webhook was lost. Saving the
+    closed state releases its all-day counts; the kitchen gets no new ticket.
+    """
+    order_details = fetch_order(order_id, auth_token)
+    print(f"Order {order_id} is {order_details.get('current_state')} on Uber. Closing it out...")
+    order_processor.process_order_details(order_id, order_details, order_cache.get_cached_order(order_id),
+                                          push_to_kitchen=False)
+
+
+def publish_drift_metrics(store_id, metrics):
+    """
+    Publishes one data point per counter to CloudWatch, dimensioned by store.
+    """
+    try:
+        cloudwatch.put_metric_data(
+            Namespace=METRICS_NAMESPACE,
+            MetricData=[
+                {
+                    'MetricName': name,
+                    'Dimensions': [{'Name': 'StoreID', 'Value': store_id}],
+                    'Value': value,
+                    'Unit': 'Count'
+                }
+                for name, value in metrics.items()
+            ]
+        )
+    except Exception as e:
+        print(f"Could not publish reconciler metrics: {e}")
+
+
+def reconcile_store(store_id, auth_token):
+    """
+    Diffs a store's active orders against the Orders table both ways: repairs
+    the orders that are missing or out of date, and closes out saved open orders
+    that Uber no longer lists as active.
+    """
+    active_orders = [order for order in list_active_orders(store_id, auth_token) if order.get('id')]
+    saved_orders = get_saved_orders([order['id'] for order in active_orders])
+
+    metrics = {'ActiveOrders': len(active_orders), 'MissingOrders': 0, 'StaleOrders': 0,
+               'ClosedOrders': 0, 'RepairedOrders': 0, 'FailedRepairs': 0}
+
+    for order in active_orders:
+        order_id = order['id']
+        discrepancy = find_discrepancy(order, saved_orders.get(order_id))
+        if not discrepancy:
+            continue
+
+        metrics['MissingOrders' if discrepancy == 'missing' else 'StaleOrders'] += 1
+        print(f"Order {order_id} in store {store_id} is out of sync ({discrepancy}). Repairing...")
+        try:
+            # The kitchen already shows an order whose cart is unchanged
+            repair_order(order, auth_token, push_to_kitchen=discrepancy != 'state')
+            metrics['RepairedOrders'] += 1
+        except Exception as e:
+            print(f"Failed to repair order {order_id}. Error: {e}")
+            metrics['FailedRepairs'] += 1
+
+    active_order_ids = {order['id'] for order in active_orders}
+    for order_id in sorted(get_open_saved_orders(store_id) - active_order_ids):
+        metrics['ClosedOrders'] += 1
+        try:
+            close_out_order(order_id, auth_token)
+            metrics['RepairedOrders'] += 1
+        except Exception as e:
+            print(f"Failed to close out order {order_id}. Error: {e}")
+            metrics['FailedRepairs'] += 1
+
+    print(f"Store {store_id} reconciled: {json.dumps(metrics)}")
+    publish_drift_metrics(store_id, metrics)
+    return metrics
+
+
+def handler(event, context):
+    """
+    This function is triggered on a schedule by EventBridge. It recovers orders
+    whose webhook was lost or dead-lettered:
+    1. Get auth token (shared cache with the OrderProcessor)
+    2. List each connected store's active orders in bulk
+    3. Diff them against the Orders table, and the store's saved open orders against them
+    4. Send only missing or out-of-date orders through the normal filter/AppSync path,
+       and re-save orders that closed without a webhook
+    5. Report drift metrics to CloudWatch
+    """
+    auth_token = order_processor.get_uber_eats_token()
+
+    results = {}
+    for store_id in get_uber_store_ids():
+        try:
+            results[store_id] = reconcile_store(store_id, auth_token)
+        except Exception as e:
+            # One store's outage should not stop the others from being reconciled
+            print(f"Failed to reconcile store {store_id}. Error: {e}")
+            import traceback
+            print(traceback.format_exc())
+            results[store_id] = {'error': str(e)}
+
+    return {'status': 'success', 'stores': results}
@@ -0,0 +1,101 @@
+import boto3
+import requests
+from datetime import datetime, timezone
+
+# --- CONFIGURATION ---
+# The names of your DynamoDB tables as defined in your Terraform files.
+ORDERS_TABLE_NAME = "Momotaro-Dashboard-Orders"
+TOKEN_CACHE_TABLE_NAME = "Momotaro-Dashboard-ApiTokenCache"
+# Orders saved before the history index existed carry no store or timestamp,
+# so they are looked up on Uber again.
+UBER_ORDER_URL_TEMPLATE = "https://api.uber.com/v1/delivery/order/{order_id}"
+# Set to False to actually write the new attributes.
+DRY_RUN = True
+# --- END CONFIGURATION ---
+
+# Must match backend/order_history.py (format_timestamp / store_day).
+def history_keys(store_id, moment):
+    moment = moment.astimezone(timezone.utc)
+    return {
+        'StoreDay': f"{store_id}#{moment.strftime('%Y-%m-%d')}",
+        'CreatedAt': moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+    }
+
+def get_cached_token(dynamodb):
+    """
+    Reads the Uber token the OrderProcessor keeps in the token cache.
+    """
+    item = dynamodb.Table(TOKEN_CACHE_TABLE_NAME).get_item(Key={'ProviderName': 'UberEats'}).get('Item')
+    if not item or item.get('ExpiresAt') <= datetime.now(timezone.utc).timestamp():
+        raise RuntimeError("No valid Uber token in the cache. Let the OrderProcessor run once, then retry.")
+    return item['AccessToken']
+
+def backfill_order_history():
+    """
+    Adds StoreID, StoreDay and CreatedAt to every order that does not have them
+    yet, so existing rows show up in the StoreDay-CreatedAt-index.
+    """
+    dynamodb = boto3.resource('dynamodb')
+    table = dynamodb.Table(ORDERS_TABLE_NAME)
+    token = get_cached_token(dynamodb)
+    headers = {'Authorization': f'Bearer {token}'}
+
+    updated, failed = 0, []
+    scan_args = {
+        'FilterExpression': 'attribute_not_exists(StoreDay)',
+        'ProjectionExpression': 'OrderID, StoreID'
+    }
+
+    print(f"Scanning '{ORDERS_TABLE_NAME}' for orders missing history keys...")
+    while True:
+        page = table.scan(**scan_args)
+        for row in page['Items']:
+            order_id = row['OrderID']
+            try:
+                response = requests.get(UBER_ORDER_URL_TEMPLATE.format(order_id=order_id), headers=headers)
+                response.raise_for_status()
+                order_details = response.json()
+
+                store_id = row.get('StoreID') or (order_details.get('store') or {}).get('id')
+                placed_at = order_details.get('placed_at')
+                if not store_id or not placed_at:
+                    raise ValueError("Uber response has no store id or placed_at")
+
+                moment = datetime.fromisoformat(placed_at.replace('Z', '+00:00'))
+                if moment.tzinfo is None:
+                    moment = moment.replace(tzinfo=timezone.utc)
+                keys = history_keys(store_id, moment)
+
+                if DRY_RUN:
+                    print(f"  -> [dry run] {order_id}: {keys['StoreDay']} {keys['CreatedAt']}")
+                else:
+                    # if_not_exists: never overwrite keys the OrderProcessor wrote meanwhile
+                    table.update_item(
+                        Key={'OrderID': order_id},
+                        UpdateExpression=(
+                            'SET StoreID = if_not_exists(StoreID, :store), '
+                            'StoreDay = if_not_exists(StoreDay, :day), '
+                            'CreatedAt = if_not_exists(CreatedAt, :created)'
+                        ),
+                        ExpressionAttributeValues={
+                            ':store': store_id,
+                            ':day': keys['StoreDay'],
+                            ':created': keys['CreatedAt']
+                        }
+                    )
+                    print(f"  -> Backfilled {order_id}: {keys['StoreDay']} {keys['CreatedAt']}")
+                updated += 1
+            except Exception as e:
+                print(f"  -> ❌ Could not backfill {order_id}: {e}")
+                failed.append(order_id)
+
+        if 'LastEvaluatedKey' not in page:
+            break
+        scan_args['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+    print(f"\n✅ Backfilled {updated} orders{' (dry run)' if DRY_RUN else ''}.")
+    if failed:
+        print(f"❌ {len(failed)} orders could not be backfilled: {', '.join(failed)}")
+
+if __name__ == "__main__":
+    backfill_order_history()
@@ -0,0 +1,173 @@
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+import order_model
+
+# --- CONFIGURATION ---
+ITEMS_PER_CART = 50
+ORDERS = 2000
+MENU_SIZE = 120
+SEED = 7
+# --- END CONFIGURATION ---
+
+def build_menu(rng):
+    """
+    Synthetic menu rows keyed by Uber ID, shaped like the Menu table.
+    """
+    menu = {}
+    for i in range(MENU_SIZE):
+        menu[f"uber-{i}"] = {
+            'ItemID': f"ITEM_{i:03d}",
+            'UberEatsID': f"uber-{i}",
+            'ItemName': f"Menu item {i}",
+            'name_mandarin': f"菜品{i}",
+            'Location': rng.choice(['back', 'back', 'both', 'front'])
+        }
+    return menu
+
+def build_order(rng, n):
+    """
+    A synthetic Uber order payload with ITEMS_PER_CART items and 0-3 modifiers each.
+    """
+    items = []
+    for i in range(ITEMS_PER_CART):
+        items.append({
+            'id': f"uber-{rng.randrange(MENU_SIZE)}",
+            'title': f"Item {i}",
+            'quantity': rng.randint(1, 3),
+            'special_instructions': rng.choice(['', 'No sesame', 'Extra spicy']),
+            'selected_modifier_groups': [{
+                'id': f"group-{i}",
+                'selected_items': [
+                    {'id': f"uber-{rng.randrange(MENU_SIZE)}", 'title': f"Modifier {m}", 'quantity': 1}
+                    for m in range(rng.randint(0, 3))
+                ]
+            }]
+        })
+    return {
+        'id': f"order-{n}",
+        'display_id': f"#{n:04d}",
+        'current_state': 'ACCEPTED',
+        'store': {'id': 'store-1'},
+        'placed_at': '2024-10-23T02:38:15Z',
+        'cart': {'items': items, 'special_instructions': 'Contact-free delivery'}
+    }
+
+def legacy_path(order_details, menu):
+    """
+    The OrderProcessor before the typed model: nested .get() chains, hand-built
+    dicts, and the items encoded separately for the log, the AWSJSON field and
+    the request body. The fetched payload is re-encoded for the log as well.
+    """
+    log = json.dumps(order_details)
+    back_of_house_items = []
+    cart = order_details.get("cart", {})
+    for item in cart.get("items", []):
+        menu_item = menu.get(item.get('id'))
+        if menu_item and menu_item.get('Location') in ['back', 'both']:
+            processed_item = {
+                'Title': menu_item.get('name_mandarin', menu_item.get('ItemName', item.get('title'))),
+                'InternalSKU': menu_item.get('ItemID'),
+                'Quantity': item.get('quantity', 1),
+                'SpecialInstructions': item.get('special_instructions', ''),
+                'Modifiers': []
+            }
+            if item.get('selected_modifier_groups'):
+                for group in item.get('selected_modifier_groups'):
+                    for modifier in group.get('selected_items', []):
+                        modifier_item = menu.get(modifier.get('id'))
+                        if modifier_item:
+                            processed_item['Modifiers'].append({
+                                'Title': modifier_item.get('name_mandarin', modifier_item.get('ItemName', modifier.get('title'))),
+                                'InternalSKU': modifier_item.get('ItemID'),
+                                'Quantity': modifier.get('quantity', 1)
+                            })
+            back_of_house_items.append(processed_item)
+
+    filtered_order = {
+        'OrderID': order_details.get('id'),
+        'DisplayID': order_details.get('display_id'),
+        'State': order_details.get('current_state'),
+        'Items': back_of_house_items,
+        'SpecialInstructions': cart.get('special_instructions', '')
+    }
+    log = json.dumps(filtered_order)
+    order_input = {
+        "OrderID": filtered_order["OrderID"],
+        "DisplayID": filtered_order["DisplayID"],
+        "State": filtered_order["State"],
+        "Items": json.dumps(filtered_order["Items"]),
+        "SpecialInstructions": filtered_order["SpecialInstructions"]
+    }
+    return filtered_order, json.dumps({"query": "", "variables": {"order": order_input}})
+
+def model_path(order_details, menu):
+    """
+    The OrderProcessor as deployed for a fresh order: one parse, the cart
+    fingerprint (canonical encode + SHA-256), the filter, the Orders item, and
+    one encode of the items shared by the log, the AWSJSON field and the order
+    cache entry. The raw body is logged as received. DynamoDB and AppSync I/O,
+    history keys and all-day count deltas are left out.
+    """
+    order = order_model.UberOrder.from_payload(order_details)
+    fingerprint = order_model.cart_fingerprint(order.cart)
+    ticket = order_model.Ticket(order, order_model.filter_back_of_house_items(order.items, menu.get))
+    filtered_order = {**ticket.to_item(), 'CartFingerprint': fingerprint}
+    log = ticket.items_json()
+    payload = order_model.dumps({"query": "", "variables": {"order": ticket.appsync_input()}})
+    cache_item = {'OrderID': order.order_id, 'Fingerprint': fingerprint, 'Items': ticket.items_json()}
+    return filtered_order, payload
+
+def measure(name, path, orders, menu):
+    """
+    Prints CPU time and peak traced allocation per order for one path.
+    """
+    path(orders[0], menu)  # warm up
+
+    start = time.process_time()
+    for order_details in orders:
+        path(order_details, menu)
+    cpu_us = (time.process_time() - start) / len(orders) * 1e6
+
+    peaks = []
+    tracemalloc.start()
+    for order_details in orders[:200]:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        path(order_details, menu)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    print(f"{name:<28} {cpu_us:10.1f} µs/order {sum(peaks) / len(peaks) / 1024:10.1f} KiB peak/order")
+    return cpu_us
+
+def run_benchmark():
+    rng = random.Random(SEED)
+    menu = build_menu(rng)
+    orders = [build_order(rng, n) for n in range(ORDERS)]
+
+    # Both paths must build the same Orders table item and AppSync items
+    legacy_item, _ = legacy_path(orders[0], menu)
+    model_item, _ = model_path(orders[0], menu)
+    assert {k: v for k, v in model_item.items() if k not in ('StoreID', 'CartFingerprint')} == legacy_item
+
+    print(f"{ORDERS} synthetic orders, {ITEMS_PER_CART} items per cart "
+          f"(orjson {'available' if order_model.orjson else 'not installed'})\n")
+    legacy = measure("legacy dict path", legacy_path, orders, menu)
+    model = measure("deployed model path", model_path, orders, menu)
+
+    if order_model.orjson is not None:
+        codec = order_model.orjson
+        order_model.orjson = None
+        measure("deployed model path (json)", model_path, orders, menu)
+        order_model.orjson = codec
+
+    print(f"\nCPU speed-up: {legacy / model:.2f}x")
+
+if __name__ == "__main__":
+    run_benchmark()
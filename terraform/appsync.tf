@@ -32,6 +32,12 @@ type Order @aws_iam @aws_cognito_user_pools {
     State: String
     Items: AWSJSON
     SpecialInstructions: String
+    CreatedAt: AWSDateTime
+}
+
+type OrderHistoryPage @aws_cognito_user_pools {
+    Orders: [Order]
+    NextToken: String
 }
 
 input OrderInput {
@@ -42,13 +48,30 @@ input OrderInput {
     SpecialInstructions: String
 }
 
+# Counts is a JSON list of { InternalSKU, Title, Count }
+type AllDayCounts @aws_iam @aws_cognito_user_pools {
+    StoreID: ID!
+    Counts: AWSJSON
+}
+
+input AllDayCountsInput {
+    StoreID: ID!
+    Counts: AWSJSON
+}
+
 type Query {
     get_status: String
+    # Every SKU with a non-zero running total across the store's open tickets
+    getAllDayCounts(StoreID: ID!): AllDayCounts @aws_cognito_user_pools
+    # Newest first; pass NextToken back to fetch the following page
+    getOrderHistory(StoreID: ID!, From: AWSDateTime!, To: AWSDateTime!, Limit: Int, NextToken: String): OrderHistoryPage @aws_cognito_user_pools
 }
 
 type Mutation {
     # Allow BOTH IAM (for Lambda) and Cognito (for frontend if needed)
     newOrder(order: OrderInput): Order @aws_iam @aws_cognito_user_pools
+    # Published by the OrderProcessor with the new totals of the SKUs an order changed
+    updateAllDayCounts(counts: AllDayCountsInput): AllDayCounts @aws_iam
 }
 
 type Subscription {
@@ -56,6 +79,9 @@ type Subscription {
     onNewOrder: Order
         @aws_subscribe(mutations: ["newOrder"])
         @aws_cognito_user_pools
+    onAllDayCountsUpdated(StoreID: ID): AllDayCounts
+        @aws_subscribe(mutations: ["updateAllDayCounts"])
+        @aws_cognito_user_pools
 }
 
 schema {
@@ -112,6 +138,162 @@ resource "aws_appsync_resolver" "get_status_resolver" {
   response_template = "$util.toJson(\"ok\")"
 }
 
+# Resolver for the all-day counts Mutation (pub/sub only, like newOrder)
+resource "aws_appsync_resolver" "update_all_day_counts_resolver" {
+  api_id      = aws_appsync_graphql_api.orders_api.id
+  type        = "Mutation"
+  field       = "updateAllDayCounts"
+  data_source = aws_appsync_datasource.none_datasource.name
+
+  request_template  = <<EOF
+{
+  "version": "2018-05-29",
+  "payload": {}
+}
+EOF
+
+  response_template = <<EOF
+$util.toJson($context.arguments.counts)
+EOF
+}
+
+# ------------------------------------------------------------------------------
+# APPSYNC DYNAMODB DATA SOURCE FOR ALL-DAY COUNTS
+# The query reads one partition of the aggregate table, so its cost depends on
+# the number of SKUs in play, not on the number of open tickets.
+# ------------------------------------------------------------------------------
+resource "aws_iam_role" "appsync_all_day_counts_role" {
+  name = "MomotaroAppSyncAllDayCountsRole"
+
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action = "sts:AssumeRole"
+        Effect = "Allow"
+        Principal = {
+          Service = "appsync.amazonaws.com"
+        }
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy" "appsync_all_day_counts_policy" {
+  name = "MomotaroAppSyncAllDayCountsPolicy"
+  role = aws_iam_role.appsync_all_day_counts_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action   = "dynamodb:Query"
+        Effect   = "Allow"
+        Resource = aws_dynamodb_table.all_day_counts.arn
+      }
+    ]
+  })
+}
+
+resource "aws_appsync_datasource" "all_day_counts_datasource" {
+  api_id           = aws_appsync_graphql_api.orders_api.id
+  name             = "AllDayCountsDataSource"
+  type             = "AMAZON_DYNAMODB"
+  service_role_arn = aws_iam_role.appsync_all_day_counts_role.arn
+
+  dynamodb_config {
+    table_name = aws_dynamodb_table.all_day_counts.name
+  }
+}
+
+resource "aws_appsync_resolver" "get_all_day_counts_resolver" {
+  api_id      = aws_appsync_graphql_api.orders_api.id
+  type        = "Query"
+  field       = "getAllDayCounts"
+  data_source = aws_appsync_datasource.all_day_counts_datasource.name
+
+  request_template = <<EOF
+{
+  "version": "2018-05-29",
+  "operation": "Query",
+  "query": {
+    "expression": "StoreID = :store",
+    "expressionValues": {
+      ":store": $util.dynamodb.toDynamoDBJson($context.arguments.StoreID)
+    }
+  },
+  "filter": {
+    "expression": "#count > :zero",
+    "expressionNames": { "#count": "Count" },
+    "expressionValues": { ":zero": $util.dynamodb.toDynamoDBJson(0) }
+  }
+}
+EOF
+
+  response_template = <<EOF
+#set($counts = [])
+#foreach($row in $context.result.items)
+  $util.qr($counts.add({ "InternalSKU": $row.InternalSKU, "Title": $row.Title, "Count": $row.Count }))
+#end
+$util.toJson({ "StoreID": $context.arguments.StoreID, "Counts": $util.toJson($counts) })
+EOF
+}
+
+# ------------------------------------------------------------------------------
+# APPSYNC LAMBDA DATA SOURCE FOR ORDER HISTORY
+# ------------------------------------------------------------------------------
+resource "aws_iam_role" "appsync_order_history_role" {
+  name = "MomotaroAppSyncOrderHistoryRole"
+
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action = "sts:AssumeRole"
+        Effect = "Allow"
+        Principal = {
+          Service = "appsync.amazonaws.com"
+        }
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy" "appsync_order_history_policy" {
+  name = "MomotaroAppSyncOrderHistoryPolicy"
+  role = aws_iam_role.appsync_order_history_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action   = "lambda:InvokeFunction"
+        Effect   = "Allow"
+        Resource = aws_lambda_function.order_history.arn
+      }
+    ]
+  })
+}
+
+resource "aws_appsync_datasource" "order_history_datasource" {
+  api_id           = aws_appsync_graphql_api.orders_api.id
+  name             = "OrderHistoryDataSource"
+  type             = "AWS_LAMBDA"
+  service_role_arn = aws_iam_role.appsync_order_history_role.arn
+
+  lambda_config {
+    function_arn = aws_lambda_function.order_history.arn
+  }
+}
+
+# No templates: AppSync passes the arguments straight to the Lambda
+resource "aws_appsync_resolver" "get_order_history_resolver" {
+  api_id      = aws_appsync_graphql_api.orders_api.id
+  type        = "Query"
+  field       = "getOrderHistory"
+  data_source = aws_appsync_datasource.order_history_datasource.name
+}
+
 # ------------------------------------------------------------------------------
 # OUTPUTS
 # ------------------------------------------------------------------------------
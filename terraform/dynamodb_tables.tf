@@ -65,12 +65,86 @@ resource "aws_dynamodb_table" "orders_table" {
     type = "S"
   }
 
+  attribute {
+    name = "StoreDay" # "{StoreID}#{YYYY-MM-DD}" (UTC)
+    type = "S"
+  }
+
+  attribute {
+    name = "CreatedAt" # ISO-8601 UTC timestamp of when the order was placed
+    type = "S"
+  }
+
+  # Serves the History page: one partition per store per day, sorted by time,
+  # so a history query never has to scan the whole table.
+  global_secondary_index {
+    name               = "StoreDay-CreatedAt-index"
+    hash_key           = "StoreDay"
+    range_key          = "CreatedAt"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["DisplayID", "State", "Items", "SpecialInstructions"]
+  }
+
   tags = {
     Name        = "Momotaro Orders Table"
     Environment = "Production"
   }
 }
 
+# ------------------------------------------------------------------------------
+# DYNAMODB TABLE FOR ALL-DAY ITEM COUNTS
+# Running total of each SKU across a store's open tickets, maintained with
+# atomic counters by the OrderProcessor. Reading it never touches the Orders table.
+# ------------------------------------------------------------------------------
+resource "aws_dynamodb_table" "all_day_counts" {
+  name         = "Momotaro-Dashboard-AllDayCounts"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "StoreID"
+  range_key    = "InternalSKU"
+
+  attribute {
+    name = "StoreID"
+    type = "S"
+  }
+
+  attribute {
+    name = "InternalSKU"
+    type = "S"
+  }
+
+  tags = {
+    Name        = "Momotaro All-Day Counts"
+    Environment = "Production"
+  }
+}
+
+# ------------------------------------------------------------------------------
+# DYNAMODB TABLE FOR THE ORDER DETAILS CACHE
+# Shared tier of the OrderProcessor's order cache. Repeat webhook events for an
+# order with an unchanged cart are served from here instead of the Uber API.
+# ------------------------------------------------------------------------------
+resource "aws_dynamodb_table" "order_cache" {
+  name         = "Momotaro-Dashboard-OrderCache"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "OrderID"
+
+  attribute {
+    name = "OrderID"
+    type = "S"
+  }
+
+  # Expired entries are removed by DynamoDB automatically.
+  ttl {
+    attribute_name = "ExpiresAt"
+    enabled        = true
+  }
+
+  tags = {
+    Name        = "Momotaro Order Cache"
+    Environment = "Production"
+  }
+}
+
 resource "aws_dynamodb_table" "integration_mapping" {
   name           = "Prepdeck-integration-mapping"
   billing_mode   = "PAY_PER_REQUEST"
@@ -146,6 +146,40 @@ resource "aws_iam_policy" "order_processor_policy" {
           aws_dynamodb_table.orders_table.arn
         ]
       },
+      {
+        Action   = ["dynamodb:GetItem", "dynamodb:PutItem"]
+        Effect   = "Allow"
+        Resource = aws_dynamodb_table.order_cache.arn
+      },
+      {
+        Action   = ["dynamodb:UpdateItem", "dynamodb:BatchGetItem"]
+        Effect   = "Allow"
+        Resource = aws_dynamodb_table.all_day_counts.arn
+      },
+      # Used by the OrderReconciler, which runs under this role
+      {
+        Action   = "dynamodb:BatchGetItem"
+        Effect   = "Allow"
+        Resource = aws_dynamodb_table.orders_table.arn
+      },
+      {
+        Action   = "dynamodb:Query"
+        Effect   = "Allow"
+        Resource = "${aws_dynamodb_table.orders_table.arn}/index/StoreDay-CreatedAt-index"
+      },
+      {
+        Action   = "dynamodb:Scan"
+        Effect   = "Allow"
+        Resource = aws_dynamodb_table.integration_mapping.arn
+      },
+      {
+        Action   = "cloudwatch:PutMetricData"
+        Effect   = "Allow"
+        Resource = "*"
+        Condition = {
+          StringEquals = { "cloudwatch:namespace" = "PrepDeck/Reconciler" }
+        }
+      },
       # THIS IS THE CHANGE: Grant permission to the specific AppSync API
       {
         Action   = "appsync:GraphQL"
@@ -173,6 +207,26 @@ resource "aws_iam_role_policy_attachment" "order_processor_attach" {
 # ------------------------------------------------------------------------------
 # LAMBDA FUNCTION DEFINITIONS
 # ------------------------------------------------------------------------------
+
+# Shared by the OrderProcessor and the OrderReconciler, which reuses its code path
+locals {
+  order_processor_environment = {
+    APPSYNC_API_URL          = aws_appsync_graphql_api.orders_api.uris["GRAPHQL"]
+    TOKEN_CACHE_TABLE        = aws_dynamodb_table.api_token_cache.name
+    MENU_TABLE               = aws_dynamodb_table.menu_table.name
+    ORDERS_TABLE             = aws_dynamodb_table.orders_table.name
+    ORDER_CACHE_TABLE        = aws_dynamodb_table.order_cache.name
+    ALL_DAY_COUNTS_TABLE     = aws_dynamodb_table.all_day_counts.name
+
+    # 👇 CORRECTED LINES 👇
+    # Pass the NAMES of the SSM parameters, not the secret values
+    CLIENT_ID_PARAM_DEV      = aws_ssm_parameter.uber_eats_client_id_dev.name
+    CLIENT_SECRET_PARAM_DEV  = aws_ssm_parameter.uber_eats_client_secret_dev.name
+    CLIENT_ID_PARAM_PROD     = aws_ssm_parameter.uber_eats_client_id_prod.name
+    CLIENT_SECRET_PARAM_PROD = aws_ssm_parameter.uber_eats_client_secret_prod.name
+  }
+}
+
 resource "aws_lambda_function" "webhook_ingestor" {
   function_name = "WebhookIngestor"
   role          = aws_iam_role.webhook_ingestor_role.arn
@@ -206,20 +260,7 @@ resource "aws_lambda_function" "order_processor" {
   timeout       = 100
 
   environment {
-    variables = {
-      APPSYNC_API_URL          = aws_appsync_graphql_api.orders_api.uris["GRAPHQL"]
-      TOKEN_CACHE_TABLE        = aws_dynamodb_table.api_token_cache.name
-      MENU_TABLE               = aws_dynamodb_table.menu_table.name
-      ORDERS_TABLE             = aws_dynamodb_table.orders_table.name
-      
-      # 👇 CORRECTED LINES 👇
-      # Pass the NAMES of the SSM parameters, not the secret values
-      CLIENT_ID_PARAM_DEV      = aws_ssm_parameter.uber_eats_client_id_dev.name
-      CLIENT_SECRET_PARAM_DEV  = aws_ssm_parameter.uber_eats_client_secret_dev.name
-      CLIENT_ID_PARAM_PROD     = aws_ssm_parameter.uber_eats_client_id_prod.name
-      CLIENT_SECRET_PARAM_PROD = aws_ssm_parameter.uber_eats_client_secret_prod.name
-      
-     }
+    variables = local.order_processor_environment
   }
 
   tags = {
@@ -228,6 +269,118 @@ resource "aws_lambda_function" "order_processor" {
   }
 }
 
+# ------------------------------------------------------------------------------
+# ORDER RECONCILER
+# Periodically lists every store's active orders from Uber in bulk and replays
+# only the ones missing from (or out of date in) the Orders table. Recovers
+# orders whose webhook was lost or dead-lettered.
+# ------------------------------------------------------------------------------
+resource "aws_lambda_function" "order_reconciler" {
+  function_name    = "OrderReconciler"
+  role             = aws_iam_role.order_processor_role.arn
+  handler          = "order_reconciler.handler"
+  runtime          = "python3.13"
+  filename         = "../backend/placeholder.zip"
+  source_code_hash = filebase64sha256("../backend/placeholder.zip")
+  timeout          = 300
+
+  environment {
+    variables = merge(local.order_processor_environment, {
+      INTEGRATION_TABLE_NAME = aws_dynamodb_table.integration_mapping.name
+    })
+  }
+
+  tags = {
+    Name        = "Order Reconciler Lambda"
+    Environment = "Production"
+  }
+}
+
+resource "aws_cloudwatch_event_rule" "order_reconciler_schedule" {
+  name                = "OrderReconcilerSchedule"
+  description         = "Runs the OrderReconciler to recover orders with lost webhooks"
+  schedule_expression = var.order_reconciler_schedule
+}
+
+resource "aws_cloudwatch_event_target" "order_reconciler_target" {
+  rule = aws_cloudwatch_event_rule.order_reconciler_schedule.name
+  arn  = aws_lambda_function.order_reconciler.arn
+}
+
+resource "aws_lambda_permission" "order_reconciler_eventbridge" {
+  statement_id  = "AllowExecutionFromEventBridge"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.order_reconciler.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.order_reconciler_schedule.arn
+}
+
+# ------------------------------------------------------------------------------
+# IAM ROLE, POLICY & FUNCTION FOR THE OrderHistory LAMBDA
+# Resolves the getOrderHistory AppSync query from the Orders table's time index.
+# ------------------------------------------------------------------------------
+resource "aws_iam_role" "order_history_role" {
+  name = "OrderHistoryLambdaRole"
+  assume_role_policy = jsonencode({
+    Version   = "2012-10-17"
+    Statement = [
+      {
+        Action    = "sts:AssumeRole"
+        Effect    = "Allow"
+        Principal = {
+          Service = "lambda.amazonaws.com"
+        }
+      },
+    ]
+  })
+}
+
+resource "aws_iam_policy" "order_history_policy" {
+  name        = "OrderHistoryLambdaPolicy"
+  description = "Policy for the OrderHistory Lambda function"
+  policy = jsonencode({
+    Version   = "2012-10-17"
+    Statement = [
+      {
+        Action   = "dynamodb:Query"
+        Effect   = "Allow"
+        Resource = "${aws_dynamodb_table.orders_table.arn}/index/StoreDay-CreatedAt-index"
+      },
+      {
+        Action   = ["logs:CreateLogGroup", "logs:CreateLogStream", "logs:PutLogEvents"]
+        Effect   = "Allow"
+        Resource = "arn:aws:logs:*:*:*"
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "order_history_attach" {
+  role       = aws_iam_role.order_history_role.name
+  policy_arn = aws_iam_policy.order_history_policy.arn
+}
+
+resource "aws_lambda_function" "order_history" {
+  function_name    = "OrderHistory"
+  role             = aws_iam_role.order_history_role.arn
+  handler          = "order_history.handler"
+  runtime          = "python3.13"
+  filename         = "../backend/placeholder.zip"
+  source_code_hash = filebase64sha256("../backend/placeholder.zip")
+  timeout          = 30
+
+  environment {
+    variables = {
+      ORDERS_TABLE = aws_dynamodb_table.orders_table.name
+    }
+  }
+
+  tags = {
+    Name        = "Order History Lambda"
+    Environment = "Production"
+  }
+}
+
 # The SQS trigger for the OrderProcessor Lambda
 resource "aws_lambda_event_source_mapping" "order_processor_trigger" {
   event_source_arn = aws_sqs_queue.order_processing_queue.arn
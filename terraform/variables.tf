@@ -18,6 +18,12 @@ variable "frontend_url_error" {
   default     = "https://prepdeck.momotarosushi.ca/integrations?service=uber&status=error" # Adjust domain/path if needed
 }
 
+variable "order_reconciler_schedule" {
+  description = "How often the OrderReconciler compares active Uber orders with the Orders table"
+  type        = string
+  default     = "rate(5 minutes)"
+}
+
 
 variable "google_client_id" {
   description = "Google OAuth Client ID"